@@ -0,0 +1,473 @@
+# gemini_cli/cache.py
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .config import CACHE_DIR, SYSTEM_INSTRUCTIONS
+
+logger = logging.getLogger(__name__)
+
+EXACT_DB_PATH = CACHE_DIR / "exact.db"
+EXACT_MAX_TEMPERATURE = 0.2
+SEMANTIC_DB_PATH = CACHE_DIR / "semantic.db"
+CONTEXT_CACHE_PATH = CACHE_DIR / "ctx_cache.json"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_THRESHOLD = 0.15
+SEMANTIC_TTL = 7 * 24 * 60 * 60
+SEMANTIC_SCHEMA_VERSION = 2
+PREFETCH_MAX_PARAPHRASES = 3
+PREFETCH_MAX_PROMPT_CHARS = 500
+PARAPHRASE_PREFIXES = ("explain ", "what is ", "tell me about ")
+# A remainder starting with one of these is a clause ("how to ...", "why ..."),
+# not a noun phrase, and does not survive being slotted into another template.
+PARAPHRASE_CLAUSE_WORDS = ("how", "why", "what", "when", "where", "whether", "to")
+PARAPHRASE_TEMPLATES = (
+    "Explain {}",
+    "What is {}?",
+    "Tell me about {}",
+)
+
+
+_UNLOADED = object()
+_encoder = _UNLOADED
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """
+    Load the local sentence embedding model once per process.
+    Returns None if sentence-transformers is not installed.
+
+    Batch requests call this from several worker threads at once, so the load
+    is guarded by a lock to make sure the model is only built once.
+    """
+    global _encoder
+    if _encoder is _UNLOADED:
+        with _encoder_lock:
+            if _encoder is _UNLOADED:
+                _encoder = _load_encoder()
+    return _encoder
+
+
+def _load_encoder():
+    """
+    Build the embedding model, or return None if it cannot be loaded.
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.debug("sentence-transformers not installed; semantic cache disabled")
+        return None
+
+    try:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception:
+        logger.debug("Failed to load embedding model %s", EMBEDDING_MODEL, exc_info=True)
+        return None
+
+
+def embed(text: str) -> Optional[List[float]]:
+    """
+    Embed text with the local encoder.
+    Returns None if no encoder is available.
+    """
+    encoder = _get_encoder()
+    if encoder is None:
+        return None
+    return encoder.encode(text, normalize_embeddings=True).tolist()
+
+
+def instructions_key() -> str:
+    """
+    Hash the system instruction so cached responses are invalidated when it changes.
+    """
+    return hashlib.blake2b(SYSTEM_INSTRUCTIONS.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def exact_key(prompt: str, ai_model: str, temperature: float, max_out: int) -> str:
+    """
+    Hash every input that determines the response into a cache key.
+    """
+    payload = json.dumps([prompt, ai_model, temperature, max_out, SYSTEM_INSTRUCTIONS])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def paraphrases(prompt: str, limit: int = PREFETCH_MAX_PARAPHRASES) -> List[str]:
+    """
+    Produce a few canonical rewordings of a prompt from fixed templates, so
+    likely follow-up variants can be matched without calling the API.
+
+    Only prompts that already ask about a noun phrase ("Explain X", "What is
+    X?", "Tell me about X") are reworded; for anything else, such as a request
+    to write or fix something or "Explain how to ...", the rewordings would ask
+    a different question, so an empty list is returned.
+    """
+    original = prompt.strip().rstrip("?.! ")
+    if len(original) > PREFETCH_MAX_PROMPT_CHARS:
+        return []
+
+    core = original
+    lowered = core.lower()
+    for prefix in PARAPHRASE_PREFIXES:
+        if lowered.startswith(prefix) and core[len(prefix):].strip():
+            core = core[len(prefix):].strip()
+            break
+    else:
+        return []
+
+    first_word = core.split(maxsplit=1)[0].lower()
+    if first_word in PARAPHRASE_CLAUSE_WORDS:
+        return []
+
+    variants = []
+    for template in PARAPHRASE_TEMPLATES:
+        variant = template.format(core)
+        if variant.rstrip("?").lower() != original.lower() and variant not in variants:
+            variants.append(variant)
+    return variants[:limit]
+
+
+class ExactCache:
+    """
+    Local cache of API responses looked up by an exact hash of the request.
+
+    Only low-temperature requests are cached, since their output is
+    effectively deterministic.
+    """
+
+    def __init__(self, path: Path = EXACT_DB_PATH, max_temperature: float = EXACT_MAX_TEMPERATURE) -> None:
+        self.path = path
+        self.max_temperature = max_temperature
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        with self._lock:
+            return self._connect_locked()
+
+    def _connect_locked(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None:
+            return self._db
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS exact_cache (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+        except (sqlite3.Error, OSError):
+            logger.debug("Failed to open exact cache", exc_info=True)
+            return None
+
+        self._db = db
+        return db
+
+    def lookup(self, prompt: str, ai_model: str, temperature: float, max_out: int) -> Optional[str]:
+        """
+        Return the cached response for this exact request, or None on a miss.
+        """
+        if temperature > self.max_temperature:
+            return None
+
+        db = self._connect()
+        if db is None:
+            return None
+
+        try:
+            with self._lock:
+                row = db.execute(
+                    "SELECT response FROM exact_cache WHERE key = ?",
+                    (exact_key(prompt, ai_model, temperature, max_out),),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.debug("Exact cache lookup failed", exc_info=True)
+            return None
+
+        return row[0] if row else None
+
+    def store(self, prompt: str, response: str, ai_model: str, temperature: float, max_out: int) -> None:
+        """
+        Cache a response for this exact request if its temperature is low enough.
+        """
+        if temperature > self.max_temperature:
+            return
+
+        db = self._connect()
+        if db is None:
+            return
+
+        try:
+            with self._lock, db:
+                db.execute(
+                    "INSERT OR REPLACE INTO exact_cache (key, response) VALUES (?, ?)",
+                    (exact_key(prompt, ai_model, temperature, max_out), response),
+                )
+        except sqlite3.Error:
+            logger.debug("Failed to store response in exact cache", exc_info=True)
+
+
+class SemanticCache:
+    """
+    Local cache of API responses looked up by prompt similarity.
+
+    Responses are namespaced by (model, temperature, max output tokens, system
+    instruction), since the same prompt produces different output under
+    different settings. Several embeddings may point at the same response row.
+    """
+
+    def __init__(
+        self,
+        path: Path = SEMANTIC_DB_PATH,
+        threshold: float = SEMANTIC_THRESHOLD,
+        ttl: int = SEMANTIC_TTL,
+    ) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        with self._lock:
+            return self._connect_locked()
+
+    def _connect_locked(self) -> Optional[sqlite3.Connection]:
+        if self._db is not None:
+            return self._db
+
+        try:
+            import sqlite_vec
+        except ImportError:
+            logger.debug("sqlite-vec not installed; semantic cache disabled")
+            return None
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.enable_load_extension(True)
+            sqlite_vec.load(db)
+            db.enable_load_extension(False)
+            # Cached answers are disposable, so an outdated schema is simply rebuilt.
+            if db.execute("PRAGMA user_version").fetchone()[0] != SEMANTIC_SCHEMA_VERSION:
+                db.executescript(
+                    """
+                    DROP TABLE IF EXISTS embeddings;
+                    DROP TABLE IF EXISTS responses;
+                    """
+                )
+            db.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS responses (
+                    id INTEGER PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    model TEXT NOT NULL,
+                    temperature REAL NOT NULL,
+                    max_out INTEGER NOT NULL,
+                    instructions TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    response_id INTEGER NOT NULL REFERENCES responses(id) ON DELETE CASCADE,
+                    embedding BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_namespace
+                    ON responses (model, temperature, max_out, instructions, ts);
+                CREATE INDEX IF NOT EXISTS embeddings_response
+                    ON embeddings (response_id);
+                PRAGMA user_version = {SEMANTIC_SCHEMA_VERSION};
+                """
+            )
+        except (sqlite3.Error, AttributeError, OSError):
+            logger.debug("Failed to open semantic cache", exc_info=True)
+            return None
+
+        self._db = db
+        return db
+
+    def lookup(self, prompt: str, ai_model: str, temperature: float, max_out: int) -> Optional[str]:
+        """
+        Return the cached response closest to the prompt, or None on a miss.
+        """
+        db = self._connect()
+        if db is None:
+            return None
+
+        namespace = (ai_model, temperature, max_out, instructions_key(), time.time() - self.ttl)
+
+        # Loading the encoder takes seconds, so skip it when there is nothing to match against.
+        try:
+            with self._lock:
+                empty = db.execute(
+                    """
+                    SELECT 1 FROM responses
+                    WHERE model = ? AND temperature = ? AND max_out = ? AND instructions = ? AND ts >= ?
+                    LIMIT 1
+                    """,
+                    namespace,
+                ).fetchone() is None
+        except sqlite3.Error:
+            logger.debug("Semantic cache lookup failed", exc_info=True)
+            return None
+
+        if empty:
+            return None
+
+        embedding = embed(prompt)
+        if embedding is None:
+            return None
+
+        import sqlite_vec
+
+        try:
+            with self._lock:
+                row = db.execute(
+                    """
+                    SELECT r.response, vec_distance_cosine(e.embedding, ?) AS distance
+                    FROM embeddings e JOIN responses r ON r.id = e.response_id
+                    WHERE r.model = ? AND r.temperature = ? AND r.max_out = ? AND r.instructions = ? AND r.ts >= ?
+                    ORDER BY distance
+                    LIMIT 1
+                    """,
+                    (sqlite_vec.serialize_float32(embedding), *namespace),
+                ).fetchone()
+        except sqlite3.Error:
+            logger.debug("Semantic cache lookup failed", exc_info=True)
+            return None
+
+        if row is None or row[1] >= self.threshold:
+            return None
+
+        logger.debug("Semantic cache hit (distance %.4f)", row[1])
+        return row[0]
+
+    def store(self, prompt: str, response: str, ai_model: str, temperature: float, max_out: int) -> Optional[int]:
+        """
+        Cache a response under the prompt's embedding, pruning expired entries.
+        Returns the id of the stored response row, or None if nothing was stored.
+        """
+        db = self._connect()
+        if db is None:
+            return None
+
+        embedding = embed(prompt)
+        if embedding is None:
+            return None
+
+        import sqlite_vec
+
+        now = time.time()
+        try:
+            with self._lock, db:
+                db.execute(
+                    "DELETE FROM embeddings WHERE response_id IN (SELECT id FROM responses WHERE ts < ?)",
+                    (now - self.ttl,),
+                )
+                db.execute("DELETE FROM responses WHERE ts < ?", (now - self.ttl,))
+                cursor = db.execute(
+                    """
+                    INSERT INTO responses (prompt, response, ts, model, temperature, max_out, instructions)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (prompt, response, now, ai_model, temperature, max_out, instructions_key()),
+                )
+                db.execute(
+                    "INSERT INTO embeddings (response_id, embedding) VALUES (?, ?)",
+                    (cursor.lastrowid, sqlite_vec.serialize_float32(embedding)),
+                )
+        except sqlite3.Error:
+            logger.debug("Failed to store response in semantic cache", exc_info=True)
+            return None
+
+        return cursor.lastrowid
+
+    def add_aliases(self, response_id: int, prompts: List[str]) -> None:
+        """
+        Point additional prompt embeddings at an already cached response.
+        """
+        db = self._connect()
+        if db is None:
+            return
+
+        import sqlite_vec
+
+        rows = []
+        for prompt in prompts:
+            embedding = embed(prompt)
+            if embedding is None:
+                return
+            rows.append((response_id, sqlite_vec.serialize_float32(embedding)))
+
+        try:
+            with self._lock, db:
+                db.executemany("INSERT INTO embeddings (response_id, embedding) VALUES (?, ?)", rows)
+        except sqlite3.Error:
+            logger.debug("Failed to store prompt aliases in semantic cache", exc_info=True)
+
+
+class ContextCacheIndex:
+    """
+    Remembers the names of Gemini CachedContent resources created for the
+    system instruction, so later invocations can reuse them until they expire.
+
+    A cached context belongs to the project behind the API key that created
+    it, so entries are keyed by a hash of the key as well as the model.
+    """
+
+    def __init__(self, path: Path = CONTEXT_CACHE_PATH) -> None:
+        self.path = path
+
+    @staticmethod
+    def _key(ai_model: str, api_key: str) -> str:
+        key_hash = hashlib.blake2b(api_key.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{ai_model}:{key_hash}:{instructions_key()}"
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries: dict) -> None:
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if v.get("expires", 0) > now}
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+        except OSError:
+            logger.debug("Failed to write context cache index", exc_info=True)
+
+    def get(self, ai_model: str, api_key: str, min_remaining: float = 0) -> Optional[str]:
+        """
+        Return the cache name for this model and API key if it is valid for at
+        least min_remaining more seconds, or None.
+        """
+        entry = self._load().get(self._key(ai_model, api_key))
+        if not entry or entry.get("expires", 0) - min_remaining <= time.time():
+            return None
+        return entry.get("name")
+
+    def put(self, ai_model: str, api_key: str, name: str, expires: float) -> None:
+        """
+        Record a cache name for this model and API key and its expiry timestamp.
+        """
+        entries = self._load()
+        entries[self._key(ai_model, api_key)] = {"name": name, "expires": expires}
+        self._save(entries)
+
+    def remove(self, ai_model: str, api_key: str) -> None:
+        """
+        Forget the cache name for this model and API key, e.g. after the server
+        reported it missing.
+        """
+        entries = self._load()
+        if entries.pop(self._key(ai_model, api_key), None) is not None:
+            self._save(entries)
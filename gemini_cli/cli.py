@@ -1,10 +1,10 @@
 # gemini_cli/cli.py
 import argparse
+import functools
+import os
 import sys
-import shutil
-import textwrap
 import logging
-from .main import generate_text
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Union
 
 logger = logging.getLogger(__name__)
 
@@ -16,44 +16,184 @@ class AnsiColors:
     RESET = "\033[0m"
 
 
-def safe_print(text: str) -> None:
+# Escape sequences are only emitted to terminals, so piped output and CI logs stay clean.
+_ERR = (AnsiColors.RED + AnsiColors.BOLD) if sys.stderr.isatty() else ""
+_ERR_RST = AnsiColors.RESET if sys.stderr.isatty() else ""
+_NOTE = AnsiColors.YELLOW if sys.stdout.isatty() else ""
+_BOLD = AnsiColors.BOLD if sys.stdout.isatty() else ""
+_RST = AnsiColors.RESET if sys.stdout.isatty() else ""
+
+
+def stream_write(text: str) -> None:
+    """
+    Write text to stdout immediately, leaving line wrapping to the terminal.
     """
-    Print text to the console without breaking words across lines.
-    If a word exceeds the terminal width, pad it with spaces to fit.
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def response_writer() -> Callable[[str], None]:
     """
+    Return the function used to write response text. It writes straight to the
+    file descriptor behind the current sys.stdout, bypassing the buffered text
+    wrapper, and falls back to stream_write if stdout has no descriptor.
+    Anything already printed through sys.stdout is flushed first so output
+    stays in order.
+    """
+    sys.stdout.flush()
     try:
-        width = shutil.get_terminal_size().columns
-    except Exception:
-        width = 80
+        fd = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return stream_write
+    return functools.partial(raw_write, fd)
 
-    wrapper = textwrap.TextWrapper(width=width, break_long_words=False, break_on_hyphens=False)
 
-    def pad_long_words(s: str) -> str:
-        parts = []
-        for word in s.split():
-            if len(word) > width:
-                parts.append(word + " " * (width - len(word)))
-            else:
-                parts.append(word)
-        return " ".join(parts)
+def raw_write(fd: int, text: str) -> None:
+    """
+    Write text as UTF-8 to a file descriptor, retrying on short writes.
+    """
+    data = memoryview(text.encode("utf-8"))
+    while data:
+        data = data[os.write(fd, data):]
 
-    padded = pad_long_words(text)
-    lines = wrapper.wrap(padded)
 
-    for line in lines:
-        print(line)
-    
-    print("\n")
+def buffer_json_fields(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Re-chunk streamed text so that JSON output is flushed at field boundaries
+    (after a string value, a comma, a closing bracket or a newline) instead of
+    mid-token. Text outside any JSON object or array is passed through per chunk.
+    """
+    pending = []
+    depth = 0
+    in_string = escaped = value_string = after_colon = False
 
+    for chunk in chunks:
+        start = 0
+        for i, ch in enumerate(chunk):
+            boundary = ch == "\n"
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+                    boundary = value_string
+            elif ch == '"':
+                in_string = True
+                value_string = after_colon and depth > 0
+                after_colon = False
+            elif ch == ":":
+                after_colon = True
+            elif ch in "{[":
+                depth += 1
+                after_colon = False
+            elif ch in "}]":
+                depth = max(depth - 1, 0)
+                after_colon = False
+                boundary = True
+            elif ch == ",":
+                after_colon = False
+                boundary = True
 
-def main():
+            if boundary:
+                pending.append(chunk[start:i + 1])
+                start = i + 1
+                yield "".join(pending)
+                pending.clear()
+
+        pending.append(chunk[start:])
+        if depth == 0 and not in_string:
+            text = "".join(pending)
+            pending.clear()
+            if text:
+                yield text
+
+    text = "".join(pending)
+    if text:
+        yield text
+
+
+def run_batch(args: argparse.Namespace, cached: List[Optional[str]]) -> None:
+    """
+    Generate responses for several prompts concurrently and print them in order.
+    Prompts with an entry in cached were already answered from the exact cache
+    and are not sent again.
+    """
+    import asyncio
+
+    from .config import get_api_keys
+    from .main import batch_generate, wait_for_prefetch
+
+    pending = [prompt for prompt, text in zip(args.prompts, cached) if text is None]
+    generated = iter(asyncio.run(batch_generate(
+        prompts=pending,
+        temperature=args.temperature,
+        max_out=args.max_output,
+        ai_model=args.model,
+        use_cache=not args.no_cache,
+        check_exact=False,
+        prefetch=args.prefetch,
+        max_in_flight=args.jobs,
+        api_keys=get_api_keys(args.keys_env)
+    )))
+    results = [text if text is not None else next(generated) for text in cached]
+
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.error("Failed to generate text: %s", result)
+
+    failed = print_results(args.prompts, results, response_writer())
+    wait_for_prefetch()
+
+    if failed:
+        sys.exit(1)
+
+
+def print_results(
+    prompts: Sequence[str],
+    results: Sequence[Union[str, BaseException]],
+    write: Callable[[str], None],
+) -> bool:
+    """
+    Print each prompt's response with write, or its error to stderr, in order.
+    Returns True if any prompt failed.
+    """
+    failed = False
+    for prompt, result in zip(prompts, results):
+        write(f"{_BOLD}> {prompt}{_RST}\n")
+        if isinstance(result, BaseException):
+            print(f"{_ERR}Error: {result}{_ERR_RST}\n", file=sys.stderr)
+            failed = True
+        else:
+            write(result + "\n\n")
+    return failed
+
+
+def lookup_exact(args: argparse.Namespace) -> List[Optional[str]]:
+    """
+    Probe the exact-match cache for every prompt. This only needs sqlite3 and
+    hashlib, so hits are answered without loading the Gemini SDK.
+    """
+    from .cache import ExactCache
+
+    cache = ExactCache()
+    return [cache.lookup(prompt, args.model, args.temperature, args.max_output) for prompt in args.prompts]
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command-line argument parser.
+    """
     parser = argparse.ArgumentParser(
         description="Terminal client for Gemini AI interactions."
     )
     parser.add_argument(
-        "prompt",
+        "prompts",
         type=str,
-        help="The prompt to send to Gemini AI."
+        nargs="+",
+        metavar="prompt",
+        help="The prompt to send to Gemini AI. Several prompts are sent concurrently."
     )
     parser.add_argument(
         "-t", "--temperature",
@@ -73,36 +213,120 @@ def main():
         default=2048,
         help="Maximum number of output tokens. (default: 2048)"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Skip the local response cache and always query the API."
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only answer from the local exact-match cache; fail instead of querying the API."
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Also cache rewordings of the prompt so similar follow-up prompts are answered locally."
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Flush streamed output at JSON field boundaries, for prompts that ask for JSON."
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=4,
+        help="Maximum number of prompts processed concurrently. (default: 4)"
+    )
+    parser.add_argument(
+        "--keys-env",
+        type=str,
+        default="GOOGLE_API_KEYS",
+        help="Environment variable holding comma-separated API keys to rotate through "
+             "when sending several prompts. (default: GOOGLE_API_KEYS)"
+    )
+    return parser
+
+
+_PARSER = _build_parser()
+
 
+def main():
     if len(sys.argv) == 1:
-        parser.print_help(sys.stderr)
+        _PARSER.print_help(sys.stderr)
         sys.exit(1)
 
-    args = parser.parse_args()
+    args = _PARSER.parse_args()
 
     if not (0.0 <= args.temperature <= 2.0):
-        print(f"{AnsiColors.RED}{AnsiColors.BOLD}Error: Temperature must be between 0.0 and 2.0.{AnsiColors.RESET}")
+        print(f"{_ERR}Error: Temperature must be between 0.0 and 2.0.{_ERR_RST}", file=sys.stderr)
         sys.exit(1)
 
     if args.max_output <= 0:
-        print(f"{AnsiColors.RED}{AnsiColors.BOLD}Error: Maximum output tokens must be positive.{AnsiColors.RESET}")
+        print(f"{_ERR}Error: Maximum output tokens must be positive.{_ERR_RST}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.jobs <= 0:
+        print(f"{_ERR}Error: Number of jobs must be positive.{_ERR_RST}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.offline and args.no_cache:
+        print(f"{_ERR}Error: --offline cannot be combined with --no-cache.{_ERR_RST}", file=sys.stderr)
         sys.exit(1)
 
-    print(f"{AnsiColors.YELLOW}Generating response...{AnsiColors.RESET}\n", end="")
+    cached: List[Optional[str]] = [None] * len(args.prompts)
+    if not args.no_cache:
+        cached = lookup_exact(args)
+        if all(text is not None for text in cached):
+            write = response_writer()
+            if len(cached) == 1:
+                write(cached[0] + "\n\n")
+            else:
+                print_results(args.prompts, cached, write)
+            sys.exit(0)
+
+        if args.offline:
+            miss = "No cached response for this prompt."
+            if len(cached) == 1:
+                print(f"{_ERR}Error: {miss}{_ERR_RST}", file=sys.stderr)
+            else:
+                results = [text if text is not None else LookupError(miss) for text in cached]
+                print_results(args.prompts, results, response_writer())
+            sys.exit(1)
+
+    print(f"{_NOTE}Generating response...{_RST}\n", end="")
+
+    if len(args.prompts) > 1:
+        run_batch(args, cached)
+        return
+
+    # Imported only after argument validation: the Gemini SDK is slow to load.
+    from .main import stream_text, wait_for_prefetch
 
     try:
-        response_text = generate_text(
-            prompt=args.prompt,
+        chunks = stream_text(
+            prompt=args.prompts[0],
             temperature=args.temperature,
             max_out=args.max_output,
-            ai_model=args.model
+            ai_model=args.model,
+            use_cache=not args.no_cache,
+            check_exact=False,
+            prefetch=args.prefetch
         )
+        if args.json:
+            chunks = buffer_json_fields(chunks)
+
+        write = response_writer()
+        for chunk in chunks:
+            write(chunk)
     except Exception as e:
         logger.error("Failed to generate text: %s", e)
-        print(f"{AnsiColors.RED}{AnsiColors.BOLD}Error: {e}{AnsiColors.RESET}")
+        print(f"{_ERR}Error: {e}{_ERR_RST}", file=sys.stderr)
         sys.exit(1)
 
-    safe_print(response_text)
+    write("\n\n")
+    wait_for_prefetch()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,59 @@
 # gemini_cli/config.py
+import functools
 import os
-from dotenv import load_dotenv
+from pathlib import Path
+from typing import List, Optional
 
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-SYSTEM_INSTRUCTIONS = "You are a gemini cli. Answers should be helpful and informative as possible. Do not use markdown nor any other kind of formatting, just plain text."
\ No newline at end of file
+SYSTEM_INSTRUCTIONS = "You are a gemini cli. Answers should be helpful and informative as possible. Do not use markdown nor any other kind of formatting, just plain text."
+
+
+def _cache_home() -> Path:
+    """
+    Return $XDG_CACHE_HOME, ignoring empty or relative values as the XDG spec
+    requires, and falling back to ~/.cache.
+    """
+    xdg_cache = os.getenv("XDG_CACHE_HOME")
+    if xdg_cache and Path(xdg_cache).is_absolute():
+        return Path(xdg_cache)
+    return Path.home() / ".cache"
+
+
+CACHE_DIR = _cache_home() / "gemini_cli"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env() -> None:
+    """
+    Load variables from .env on first use, so that startup paths which never
+    need an API key (such as --help) skip importing python-dotenv.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def get_api_key() -> Optional[str]:
+    """
+    Return the GOOGLE_API_KEY setting, loading .env if needed.
+    """
+    _load_env()
+    return os.getenv("GOOGLE_API_KEY")
+
+
+def get_api_keys(env_var: str = "GOOGLE_API_KEYS") -> List[str]:
+    """
+    Read a comma-separated list of API keys from env_var.
+    Falls back to GOOGLE_API_KEY if the variable is unset or empty.
+    """
+    _load_env()
+    keys = [key.strip() for key in os.getenv(env_var, "").split(",") if key.strip()]
+    if not keys and get_api_key():
+        keys = [get_api_key()]
+    return keys
+
+
+def use_http2() -> bool:
+    """
+    Return True if GOOGLE_GENAI_HTTP2=1 asks for HTTP/2 connections to the API.
+    """
+    _load_env()
+    return os.getenv("GOOGLE_GENAI_HTTP2") == "1"
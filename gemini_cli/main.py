@@ -1,20 +1,49 @@
 # gemini_cli/main.py
 
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import importlib.util
+import itertools
 import logging
-from typing import Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Union
 
-from google.genai import Client, types
+from .cache import ContextCacheIndex, ExactCache, SemanticCache, paraphrases
+from .config import SYSTEM_INSTRUCTIONS, get_api_key, use_http2
 
-from .config import GOOGLE_API_KEY, SYSTEM_INSTRUCTIONS
+if TYPE_CHECKING:
+    from google.genai import Client, types
 
 logger = logging.getLogger(__name__)
 
+_exact_cache = ExactCache()
+_semantic_cache = SemanticCache()
+_context_caches = ContextCacheIndex()
+_prefetch_threads: List[threading.Thread] = []
+_context_cache_lock = threading.Lock()
+
+# Gemini refuses to cache contexts shorter than this many tokens.
+CONTEXT_CACHE_MIN_TOKENS = 2048
+CONTEXT_CACHE_TTL = 3600
+CONTEXT_CACHE_REFRESH_MARGIN = 300
+
+# Keep enough idle connections around for a full batch to reuse.
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+HTTP_KEEPALIVE_EXPIRY = 60
+
 
 def generate_text(
     prompt: str,
     temperature: float = 0.7,
     max_out: int = 2048,
     ai_model: str = "gemini-2.0-flash",
+    use_cache: bool = True,
+    check_exact: bool = True,
+    prefetch: bool = False,
 ) -> str:
     """
     Generate text via the Gemini API.
@@ -24,6 +53,10 @@ def generate_text(
         temperature (float): Sampling temperature (higher -> more random). Default: 0.7.
         max_out (int): Maximum number of tokens to generate. Default: 2048.
         ai_model (str): Model identifier. Default: "gemini-2.0-flash".
+        use_cache (bool): Look up and store the response in the local caches. Default: True.
+        check_exact (bool): Look the request up in the exact cache; pass False if the
+            caller already did. Default: True.
+        prefetch (bool): Also cache likely rewordings of the prompt in the background. Default: False.
 
     Returns:
         str: The generated text.
@@ -32,55 +65,474 @@ def generate_text(
         RuntimeError: If API key is missing or communication fails.
         ValueError: If the API responds with no usable content.
     """
-    if not GOOGLE_API_KEY:
+    if use_cache:
+        cached = _lookup_cached(prompt, temperature, max_out, ai_model, check_exact)
+        if cached is not None:
+            return cached
+
+    api_key = _require_api_key()
+    with _api_errors():
+        client, config = _prepare(api_key, temperature, max_out, ai_model)
+        response = _call_with_inline_fallback(
+            lambda cfg: client.models.generate_content(model=ai_model, contents=prompt, config=cfg),
+            config,
+            api_key,
+            ai_model,
+        )
+        return _finish(response, prompt, temperature, max_out, ai_model, use_cache, prefetch)
+
+
+def stream_text(
+    prompt: str,
+    temperature: float = 0.7,
+    max_out: int = 2048,
+    ai_model: str = "gemini-2.0-flash",
+    use_cache: bool = True,
+    check_exact: bool = True,
+    prefetch: bool = False,
+) -> Iterator[str]:
+    """
+    Stream text from the Gemini API, yielding chunks as they arrive.
+    Takes the same arguments and raises the same errors as generate_text.
+
+    Yields:
+        str: Successive pieces of the generated text.
+    """
+    if use_cache:
+        cached = _lookup_cached(prompt, temperature, max_out, ai_model, check_exact)
+        if cached is not None:
+            yield cached
+            return
+
+    api_key = _require_api_key()
+    with _api_errors():
+        client, config = _prepare(api_key, temperature, max_out, ai_model)
+
+        # The request is only sent once the stream is first advanced, so the
+        # first chunk is fetched inside the fallback.
+        stream = _call_with_inline_fallback(
+            lambda cfg: _start_stream(
+                client.models.generate_content_stream(model=ai_model, contents=prompt, config=cfg)
+            ),
+            config,
+            api_key,
+            ai_model,
+        )
+
+        last_chunk = None
+        parts = []
+        for chunk in stream:
+            last_chunk = chunk
+            text = _extract_first_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+
+        if not parts:
+            _raise_no_content(last_chunk)
+
+        if use_cache:
+            _store_cached(prompt, "".join(parts), temperature, max_out, ai_model, prefetch)
+
+
+async def agenerate_text(
+    prompt: str,
+    temperature: float = 0.7,
+    max_out: int = 2048,
+    ai_model: str = "gemini-2.0-flash",
+    use_cache: bool = True,
+    check_exact: bool = True,
+    prefetch: bool = False,
+    api_key: Optional[str] = None,
+) -> str:
+    """
+    Generate text via the Gemini API without blocking the event loop.
+    Takes the same arguments and raises the same errors as generate_text, plus:
+
+    Args:
+        api_key (Optional[str]): API key to use instead of GOOGLE_API_KEY. Default: None.
+    """
+    # Cache lookups, encoder loading and config setup block, so they run in
+    # worker threads to keep concurrent requests from queueing behind them.
+    if use_cache:
+        cached = await asyncio.to_thread(_lookup_cached, prompt, temperature, max_out, ai_model, check_exact)
+        if cached is not None:
+            return cached
+
+    api_key = _require_api_key(api_key)
+    with _api_errors():
+        client, config = await asyncio.to_thread(_prepare, api_key, temperature, max_out, ai_model)
+        response = await _acall_with_inline_fallback(
+            lambda cfg: client.aio.models.generate_content(model=ai_model, contents=prompt, config=cfg),
+            config,
+            api_key,
+            ai_model,
+        )
+        return await asyncio.to_thread(
+            _finish, response, prompt, temperature, max_out, ai_model, use_cache, prefetch
+        )
+
+
+async def batch_generate(
+    prompts: Sequence[str],
+    temperature: float = 0.7,
+    max_out: int = 2048,
+    ai_model: str = "gemini-2.0-flash",
+    use_cache: bool = True,
+    check_exact: bool = True,
+    prefetch: bool = False,
+    max_in_flight: int = 4,
+    api_keys: Optional[Sequence[str]] = None,
+) -> List[Union[str, BaseException]]:
+    """
+    Generate text for several prompts concurrently.
+
+    Requests are spread round-robin across api_keys to raise the effective
+    rate limit, with at most max_in_flight requests outstanding at once.
+
+    Args:
+        prompts (Sequence[str]): The prompts to send to the model.
+        temperature (float): Sampling temperature (higher -> more random). Default: 0.7.
+        max_out (int): Maximum number of tokens to generate. Default: 2048.
+        ai_model (str): Model identifier. Default: "gemini-2.0-flash".
+        use_cache (bool): Look up and store the responses in the local caches. Default: True.
+        check_exact (bool): Look the requests up in the exact cache; pass False if the
+            caller already did. Default: True.
+        prefetch (bool): Also cache likely rewordings of the prompts in the background. Default: False.
+        max_in_flight (int): Maximum number of concurrent requests. Default: 4.
+        api_keys (Optional[Sequence[str]]): API keys to rotate through. Default: GOOGLE_API_KEY only.
+
+    Returns:
+        List[Union[str, BaseException]]: One entry per prompt, in order: the
+        generated text, or the exception raised while generating it.
+    """
+    keys = itertools.cycle(api_keys or [get_api_key()])
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run(prompt: str, api_key: Optional[str]) -> str:
+        async with semaphore:
+            return await agenerate_text(
+                prompt=prompt,
+                temperature=temperature,
+                max_out=max_out,
+                ai_model=ai_model,
+                use_cache=use_cache,
+                check_exact=check_exact,
+                prefetch=prefetch,
+                api_key=api_key,
+            )
+
+    return await asyncio.gather(
+        *(run(prompt, next(keys)) for prompt in prompts),
+        return_exceptions=True,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _genai():
+    """
+    Import the Gemini SDK on first use. It pulls in pydantic, httpx and
+    friends, which dominate startup time, and is not needed on cache hits.
+    """
+    from google.genai import Client, types
+    return Client, types
+
+
+@functools.lru_cache(maxsize=16)
+def _get_client(api_key: str) -> Client:
+    """
+    Return a shared client for this API key, so its HTTP connections are reused
+    across calls. The client must not be mutated.
+    """
+    client_cls, types = _genai()
+    return client_cls(api_key=api_key, http_options=_http_options(types))
+
+
+def _http_options(types) -> types.HttpOptions:
+    """
+    Tune the SDK's httpx transport: a larger keep-alive pool, and HTTP/2 when
+    GOOGLE_GENAI_HTTP2=1 (which requires the h2 package).
+    """
+    import httpx
+
+    client_args = {
+        "limits": httpx.Limits(
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    }
+    if use_http2():
+        client_args["http2"] = True
+
+    # With aiohttp installed the SDK's async client uses it instead of httpx,
+    # and these arguments would not apply.
+    if importlib.util.find_spec("aiohttp") is not None:
+        return types.HttpOptions(client_args=client_args)
+    return types.HttpOptions(client_args=client_args, async_client_args=dict(client_args))
+
+
+def _require_api_key(api_key: Optional[str] = None) -> str:
+    """
+    Return api_key, or the configured GOOGLE_API_KEY if none is given.
+    Raises RuntimeError if neither is set.
+    """
+    api_key = api_key or get_api_key()
+    if not api_key:
         raise RuntimeError("API key is not configured. Please set GOOGLE_API_KEY in your config.")
+    return api_key
+
 
+@contextlib.contextmanager
+def _api_errors() -> Iterator[None]:
+    """
+    Log failures while talking to the API and re-raise them as RuntimeError.
+    """
     try:
-        client = Client(api_key=GOOGLE_API_KEY)
-        config = types.GenerateContentConfig(
+        yield
+    except Exception as e:
+        logger.exception("Error while calling Gemini API")
+        raise RuntimeError(f"Error communicating with Gemini API: {e}") from e
+
+
+def _prepare(api_key: str, temperature: float, max_out: int, ai_model: str):
+    """
+    Return the shared client and generation config for a request.
+    """
+    client = _get_client(api_key)
+    return client, _build_config(client, api_key, temperature, max_out, ai_model)
+
+
+def _finish(
+    response,
+    prompt: str,
+    temperature: float,
+    max_out: int,
+    ai_model: str,
+    use_cache: bool,
+    prefetch: bool,
+) -> str:
+    """
+    Extract the text from a complete response and cache it.
+    Raises ValueError if the response has no usable content.
+    """
+    text = _extract_first_text(response)
+    if text is None:
+        _raise_no_content(response)
+
+    if use_cache:
+        _store_cached(prompt, text, temperature, max_out, ai_model, prefetch)
+    return text
+
+
+def _raise_no_content(response) -> None:
+    """
+    Raise ValueError for a response without text, including the prompt feedback if any.
+    """
+    if getattr(response, "prompt_feedback", None):
+        raise ValueError(f"Generation failed: {response.prompt_feedback}")
+
+    raise ValueError("Generation failed: no content returned by the API.")
+
+
+def _build_config(
+    client: Client,
+    api_key: str,
+    temperature: float,
+    max_out: int,
+    ai_model: str,
+) -> types.GenerateContentConfig:
+    """
+    Build the generation config, referencing a cached system instruction when one is available.
+    """
+    return _get_config(temperature, max_out, _get_context_cache(client, api_key, ai_model))
+
+
+@functools.lru_cache(maxsize=32)
+def _get_config(temperature: float, max_out: int, cache_name: Optional[str]) -> types.GenerateContentConfig:
+    """
+    Return a shared generation config for these settings. The config must not be mutated.
+    """
+    _, types = _genai()
+    if cache_name:
+        return types.GenerateContentConfig(
             max_output_tokens=max_out,
             temperature=temperature,
-            system_instruction=SYSTEM_INSTRUCTIONS,
+            cached_content=cache_name,
         )
 
-        response = client.models.generate_content(
-            model=ai_model,
-            contents=prompt,
-            config=config,
-        )
+    return types.GenerateContentConfig(
+        max_output_tokens=max_out,
+        temperature=temperature,
+        system_instruction=SYSTEM_INSTRUCTIONS,
+    )
+
+
+def _get_context_cache(client: Client, api_key: str, ai_model: str) -> Optional[str]:
+    """
+    Return the name of a CachedContent holding the system instruction, creating
+    or refreshing it as needed. Returns None if the instruction is too short to
+    be cached or the cache could not be created, in which case the instruction
+    should be sent inline.
+    """
+    # Rough estimate of ~4 characters per token; avoids a count_tokens round-trip.
+    if len(SYSTEM_INSTRUCTIONS) // 4 < CONTEXT_CACHE_MIN_TOKENS:
+        return None
+
+    name = _context_caches.get(ai_model, api_key, min_remaining=CONTEXT_CACHE_REFRESH_MARGIN)
+    if name:
+        return name
+
+    # Batch requests prepare their configs in parallel worker threads; without
+    # the lock each would create (and be billed for) its own cached context.
+    with _context_cache_lock:
+        name = _context_caches.get(ai_model, api_key, min_remaining=CONTEXT_CACHE_REFRESH_MARGIN)
+        if name:
+            return name
+
+        _, types = _genai()
+        try:
+            cache = client.caches.create(
+                model=ai_model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=SYSTEM_INSTRUCTIONS,
+                    ttl=f"{CONTEXT_CACHE_TTL}s",
+                ),
+            )
+        except Exception:
+            logger.debug("Failed to create context cache", exc_info=True)
+            return None
+
+        _context_caches.put(ai_model, api_key, cache.name, time.time() + CONTEXT_CACHE_TTL)
+        return cache.name
+
+
+def _is_stale_context_cache(config: types.GenerateContentConfig, error: Exception) -> bool:
+    """
+    Return True if a request failed because its cached context no longer
+    exists or belongs to another project.
+    """
+    return bool(config.cached_content) and getattr(error, "code", None) in (403, 404)
+
+
+def _inline_config(config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+    """
+    Return the equivalent of config that sends the system instruction inline.
+    """
+    return _get_config(config.temperature, config.max_output_tokens, None)
+
 
-        text = _extract_first_text(response)
-        if text is not None:
-            return text
+def _call_with_inline_fallback(call, config: types.GenerateContentConfig, api_key: str, ai_model: str):
+    """
+    Run call(config). If it fails because the cached context is stale, forget
+    the cache and retry once with the system instruction sent inline.
+    """
+    try:
+        return call(config)
+    except Exception as e:
+        if not _is_stale_context_cache(config, e):
+            raise
+        logger.debug("Cached context %s is unusable; sending instruction inline", config.cached_content)
 
-        if getattr(response, "prompt_feedback", None):
-            raise ValueError(f"Generation failed: {response.prompt_feedback}")
+    _context_caches.remove(ai_model, api_key)
+    return call(_inline_config(config))
 
-        raise ValueError("Generation failed: no content returned by the API.")
 
+async def _acall_with_inline_fallback(call, config: types.GenerateContentConfig, api_key: str, ai_model: str):
+    """
+    Async counterpart of _call_with_inline_fallback; call(config) returns an awaitable.
+    """
+    try:
+        return await call(config)
     except Exception as e:
-        logger.exception("Error while calling Gemini API")
-        raise RuntimeError(f"Error communicating with Gemini API: {e}") from e
+        if not _is_stale_context_cache(config, e):
+            raise
+        logger.debug("Cached context %s is unusable; sending instruction inline", config.cached_content)
 
+    _context_caches.remove(ai_model, api_key)
+    return await call(_inline_config(config))
 
-def _extract_first_text(response) -> Optional[str]:
+
+def _start_stream(stream: Iterator) -> Iterator:
     """
-    Helper to pull out the first chunk of text from the API response.
-    Returns None if no valid text is found.
+    Advance a response stream to its first chunk, so the request is sent (and
+    can fail) now, and return an iterator over all of its chunks.
     """
+    stream = iter(stream)
     try:
-        candidates = getattr(response, "candidates", None)
-        if not candidates:
-            return None
+        first = next(stream)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], stream)
 
-        candidate = candidates[0]
-        content = getattr(candidate, "content", None)
-        parts = getattr(content, "parts", None) if content else None
 
-        if parts and len(parts) > 0 and hasattr(parts[0], "text"):
-            return parts[0].text or ""
+def _lookup_cached(
+    prompt: str,
+    temperature: float,
+    max_out: int,
+    ai_model: str,
+    check_exact: bool = True,
+) -> Optional[str]:
+    """
+    Look the request up in the exact cache first (unless check_exact is
+    False), then the semantic cache. Returns None on a miss.
+    """
+    if check_exact:
+        cached = _exact_cache.lookup(prompt, ai_model, temperature, max_out)
+        if cached is not None:
+            return cached
+    return _semantic_cache.lookup(prompt, ai_model, temperature, max_out)
 
+
+def _store_cached(
+    prompt: str,
+    response: str,
+    temperature: float,
+    max_out: int,
+    ai_model: str,
+    prefetch: bool = False,
+) -> None:
+    """
+    Store a fresh response in both local caches, optionally warming the
+    semantic cache with rewordings of the prompt on a background thread.
+    """
+    _exact_cache.store(prompt, response, ai_model, temperature, max_out)
+    response_id = _semantic_cache.store(prompt, response, ai_model, temperature, max_out)
+
+    if prefetch and response_id is not None:
+        thread = threading.Thread(target=_prefetch, args=(response_id, prompt), daemon=True)
+        thread.start()
+        _prefetch_threads.append(thread)
+
+
+def _prefetch(response_id: int, prompt: str) -> None:
+    """
+    Point embeddings of a few paraphrases of the prompt at its cached response.
+    """
+    try:
+        _semantic_cache.add_aliases(response_id, paraphrases(prompt))
     except Exception:
-        logger.debug("Failed to extract text from response", exc_info=True)
+        logger.debug("Failed to prefetch paraphrases", exc_info=True)
 
-    return None
+
+def wait_for_prefetch(timeout: Optional[float] = None) -> None:
+    """
+    Wait for background prefetch work to finish, e.g. before the process exits.
+    """
+    while _prefetch_threads:
+        _prefetch_threads.pop().join(timeout)
+
+
+def _extract_first_text(response) -> Optional[str]:
+    """
+    Helper to pull out the text from the API response, preferring the SDK's
+    own accessor and falling back to the first part of the first candidate.
+    Returns None if no valid text is found.
+    """
+    text = getattr(response, "text", None)
+    if text:
+        return text
+
+    try:
+        return response.candidates[0].content.parts[0].text or ""
+    except (AttributeError, IndexError, TypeError):
+        return None
@@ -104,10 +104,10 @@ $venv_python -m pip install -r "$REQUIREMENTS_FILE" || error_exit "Dependency in
 success "Dependencies installed"
 
 # 5a. Verify key package
-if ! $venv_python -m pip show google-generativeai &>/dev/null; then
-    warning "google-generativeai not found in venv. Double-check requirements.txt"
+if ! $venv_python -m pip show google-genai &>/dev/null; then
+    warning "google-genai not found in venv. Double-check requirements.txt"
 else
-    success "Key package google-generativeai is installed"
+    success "Key package google-genai is installed"
 fi
 
 # 6. Prepare launcher directory